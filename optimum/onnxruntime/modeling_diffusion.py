@@ -17,11 +17,15 @@ import inspect
 import logging
 import os
 import shutil
+import threading
+import weakref
 from abc import abstractmethod
 from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import cached_property
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Any, Dict, Optional, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 import torch
@@ -40,13 +44,11 @@ from diffusers.pipelines import (
     StableDiffusionXLPipeline,
 )
 from diffusers.pipelines.pipeline_utils import DiffusionPipeline
-from diffusers.schedulers import SchedulerMixin
 from diffusers.schedulers.scheduling_utils import SCHEDULER_CONFIG_NAME
 from diffusers.utils.constants import CONFIG_NAME
 from huggingface_hub import snapshot_download
 from huggingface_hub.constants import HUGGINGFACE_HUB_CACHE
 from huggingface_hub.utils import validate_hf_hub_args
-from transformers import CLIPFeatureExtractor, CLIPTokenizer
 from transformers.file_utils import add_end_docstrings
 from transformers.modeling_outputs import ModelOutput
 
@@ -62,8 +64,8 @@ from ..utils import (
     DIFFUSION_MODEL_VAE_DECODER_SUBFOLDER,
     DIFFUSION_MODEL_VAE_ENCODER_SUBFOLDER,
 )
-from .io_binding import TypeHelper
-from .modeling_ort import ONNX_MODEL_END_DOCSTRING, ORTModel
+from .io_binding import IOBindingHelper, TypeHelper
+from .modeling_ort import ONNX_MODEL_END_DOCSTRING, ORTModel, _compile_axis_expression
 from .utils import (
     ONNX_WEIGHTS_NAME,
     get_provider_for_device,
@@ -73,6 +75,10 @@ from .utils import (
 )
 
 
+if TYPE_CHECKING:
+    from diffusers.schedulers import SchedulerMixin
+    from transformers import CLIPFeatureExtractor, CLIPTokenizer
+
 if check_if_diffusers_greater("0.25.0"):
     from diffusers.models.autoencoders.vae import DiagonalGaussianDistribution
 else:
@@ -81,11 +87,101 @@ else:
 
 logger = logging.getLogger(__name__)
 
+# the number of input shapes for which a pipeline part keeps the resolved output shapes
+_OUTPUT_SHAPES_CACHE_SIZE = 8
+
+# an allocator can only be registered once in the ONNX Runtime environment, which is shared by all the sessions
+_SHARED_CPU_ALLOCATOR_REGISTERED = False
+_SHARED_CPU_ALLOCATOR_LOCK = threading.Lock()
+
+
+def _register_shared_cpu_allocator():
+    global _SHARED_CPU_ALLOCATOR_REGISTERED
+
+    with _SHARED_CPU_ALLOCATOR_LOCK:
+        if _SHARED_CPU_ALLOCATOR_REGISTERED:
+            return
+
+        memory_info = ort.OrtMemoryInfo("Cpu", ort.OrtAllocatorType.ORT_ARENA_ALLOCATOR, 0, ort.OrtMemType.DEFAULT)
+        ort.create_and_register_allocator(memory_info, ort.OrtArenaCfg(0, -1, -1, -1))
+        _SHARED_CPU_ALLOCATOR_REGISTERED = True
+
+
+def _get_shared_session_options(provider: str, use_shared_cpu_allocator: bool = False) -> ort.SessionOptions:
+    """
+    Creates the session options shared by all the sessions of a pipeline. With `use_shared_cpu_allocator=True` on CPU,
+    the sessions use an arena allocator registered in the ONNX Runtime environment instead of each creating its own.
+    This arena lives as long as the process, its memory not being released when the pipeline is deleted. An application
+    registering its own CPU allocator can instead pass session options with `session.use_env_allocators` set.
+    """
+    session_options = ort.SessionOptions()
+    # this is the default level, set explicitly since the VAE relies on the conv fusions it enables
+    session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+    if provider == "CPUExecutionProvider" and use_shared_cpu_allocator:
+        _register_shared_cpu_allocator()
+        session_options.add_session_config_entry("session.use_env_allocators", "1")
+
+    return session_options
+
+
+def _fast_copy(src_path: Path, dst_path: Path, hard_link: bool = False):
+    """
+    Copies a file without reading it through Python. With `hard_link=True`, the destination is a hard link to the
+    source when both are on the same filesystem, which is only safe for source files owned by the pipeline (as writing
+    to one of the files in place then writes to the other). Otherwise, the file is copied with `copy_file_range`, with
+    which filesystems supporting it share the blocks of the two files until one is written (e.g. Btrfs or XFS), and
+    falls back to a regular copy.
+    """
+    if dst_path.exists():
+        if os.path.samefile(src_path, dst_path):
+            return
+        dst_path.unlink()
+
+    if hard_link:
+        try:
+            os.link(src_path, dst_path)
+            return
+        except OSError:
+            pass
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src_path, "rb") as src_file, open(dst_path, "wb") as dst_file:
+                remaining_size = os.fstat(src_file.fileno()).st_size
+                while remaining_size > 0:
+                    copied_size = os.copy_file_range(src_file.fileno(), dst_file.fileno(), remaining_size)
+                    if copied_size == 0:
+                        break
+                    remaining_size -= copied_size
+            if remaining_size == 0:
+                return
+        except OSError:
+            pass
+
+    shutil.copyfile(src_path, dst_path)
+
 
 # TODO: support from_pipe()
 # TODO: Instead of ORTModel, it makes sense to have a compositional ORTMixin
 # TODO: instead of one bloated __init__, we should consider an __init__ per pipeline
 class ORTDiffusionPipeline(ORTModel, DiffusionPipeline):
+    """
+    Diffusion pipeline whose models are run with ONNX Runtime. It is loaded with `from_pretrained`, which takes the
+    arguments of [`~onnxruntime.modeling_ort.ORTModel.from_pretrained`] along with:
+
+    Args:
+        enable_cuda_graph (`bool`, defaults to `False`):
+            Whether to capture the UNet session in a CUDA graph during its first run and replay it at the following
+            ones, which removes the kernel launch overhead of each denoising step. Only the UNet is captured, and it
+            requires the `CUDAExecutionProvider` with IO binding. The inputs shapes can then not change between calls,
+            the pipeline having to be loaded again to generate images of another size or batch size.
+        use_shared_cpu_allocator (`bool`, defaults to `False`):
+            Whether the sessions on `CPUExecutionProvider` use a single arena allocator registered in the ONNX Runtime
+            environment, instead of one each. This arena lives for the whole process, its memory not being released
+            when the pipeline is deleted.
+    """
+
     config_name = "model_index.json"
     auto_model_class = DiffusionPipeline
 
@@ -163,23 +259,36 @@ class ORTDiffusionPipeline(ORTModel, DiffusionPipeline):
     def _save_pretrained(self, save_directory: Union[str, Path]):
         save_directory = Path(save_directory)
 
-        models_to_save_paths = {
+        # the files of a pipeline exported on the fly are in a temporary directory it owns, and can be hard linked
+        # without the saved files aliasing the ones of the Hugging Face cache or of the user, which is not the case of
+        # the sessions given by the user along with the export
+        owned_directory = None
+        if self._model_save_dir_tempdirectory_instance is not None:
+            owned_directory = Path(self.model_save_dir).resolve()
+
+        def is_owned(path: Path) -> bool:
+            return owned_directory is not None and path.resolve().is_relative_to(owned_directory)
+
+        models_to_save_paths = [
             (self.unet, save_directory / DIFFUSION_MODEL_UNET_SUBFOLDER),
             (self.vae_decoder, save_directory / DIFFUSION_MODEL_VAE_DECODER_SUBFOLDER),
             (self.vae_encoder, save_directory / DIFFUSION_MODEL_VAE_ENCODER_SUBFOLDER),
             (self.text_encoder, save_directory / DIFFUSION_MODEL_TEXT_ENCODER_SUBFOLDER),
             (self.text_encoder_2, save_directory / DIFFUSION_MODEL_TEXT_ENCODER_2_SUBFOLDER),
-        }
+        ]
         for model, save_path in models_to_save_paths:
             if model is not None:
                 model_path = Path(model.session._model_path)
                 save_path.mkdir(parents=True, exist_ok=True)
                 # copy onnx model
-                shutil.copyfile(model_path, save_path / ONNX_WEIGHTS_NAME)
+                _fast_copy(model_path, save_path / ONNX_WEIGHTS_NAME, hard_link=is_owned(model_path))
                 # copy external onnx data
-                external_data_paths = _get_model_external_data_paths(model_path)
-                for external_data_path in external_data_paths:
-                    shutil.copyfile(external_data_path, save_path / external_data_path.name)
+                for external_data_path in model._get_external_data_paths():
+                    _fast_copy(
+                        external_data_path,
+                        save_path / external_data_path.name,
+                        hard_link=is_owned(external_data_path),
+                    )
                 # copy model config
                 config_path = model_path.parent / CONFIG_NAME
                 if config_path.is_file():
@@ -217,12 +326,17 @@ class ORTDiffusionPipeline(ORTModel, DiffusionPipeline):
         provider_options: Optional[Dict[str, Any]] = None,
         session_options: Optional[ort.SessionOptions] = None,
         model_save_dir: Optional[Union[str, Path, TemporaryDirectory]] = None,
+        enable_cuda_graph: bool = False,
+        use_shared_cpu_allocator: bool = False,
         **kwargs,
     ):
-        if use_io_binding:
-            raise ValueError(
-                "IOBinding is not yet available for diffusion pipelines, please set `use_io_binding` to False."
-            )
+        if enable_cuda_graph:
+            if provider != "CUDAExecutionProvider":
+                raise ValueError(
+                    f"CUDA graphs can only be used with the CUDAExecutionProvider, but got the provider {provider}."
+                )
+            if use_io_binding is False:
+                raise ValueError("CUDA graphs require IO binding, please set `use_io_binding` to True.")
 
         if not os.path.isdir(str(model_id)):
             all_components = {key for key in config.keys() if not key.startswith("_")} | {"vae_encoder", "vae_decoder"}
@@ -265,15 +379,32 @@ class ORTDiffusionPipeline(ORTModel, DiffusionPipeline):
             "text_encoder_2": model_save_path / DIFFUSION_MODEL_TEXT_ENCODER_2_SUBFOLDER / text_encoder_2_file_name,
         }
 
+        if session_options is None:
+            session_options = _get_shared_session_options(provider, use_shared_cpu_allocator)
+
         sessions = {}
-        for model, path in model_paths.items():
-            if kwargs.get(model, None) is not None:
-                # this allows passing a model directly to from_pretrained
-                sessions[f"{model}_session"] = kwargs.pop(model)
-            else:
-                sessions[f"{model}_session"] = (
-                    ORTModel.load_model(path, provider, session_options, provider_options) if path.is_file() else None
-                )
+        session_futures = {}
+        # the sessions are independent and ONNX Runtime releases the GIL while initializing them, so they are loaded
+        # in parallel and the pipeline loading time is bounded by the one of the largest model instead of their sum
+        with ThreadPoolExecutor(max_workers=len(model_paths)) as executor:
+            for model, path in model_paths.items():
+                if kwargs.get(model, None) is not None:
+                    # this allows passing a model directly to from_pretrained
+                    sessions[f"{model}_session"] = kwargs.pop(model)
+                elif path.is_file():
+                    model_provider_options = provider_options
+                    if model == "unet" and enable_cuda_graph:
+                        # the UNet is run with the same shapes at each denoising step, which suits CUDA graphs
+                        model_provider_options = {**(provider_options or {}), "enable_cuda_graph": "1"}
+
+                    session_futures[f"{model}_session"] = executor.submit(
+                        ORTModel.load_model, path, provider, session_options, model_provider_options
+                    )
+                else:
+                    sessions[f"{model}_session"] = None
+
+        for session_name, session_future in session_futures.items():
+            sessions[session_name] = session_future.result()
 
         submodels = {}
         for submodel in {"scheduler", "tokenizer", "tokenizer_2", "feature_extractor"}:
@@ -385,21 +516,34 @@ class ORTDiffusionPipeline(ORTModel, DiffusionPipeline):
         if device.type == "cuda" and self.providers[0] == "TensorrtExecutionProvider":
             return self
 
-        self.unet.session.set_providers([provider], provider_options=[provider_options])
-        self.vae_decoder.session.set_providers([provider], provider_options=[provider_options])
+        # IOBinding is only supported for CPU and CUDA Execution Providers.
+        if device.type == "cuda" and self._use_io_binding is False and provider == "CUDAExecutionProvider":
+            self.use_io_binding = True
+            logger.info(
+                "use_io_binding was set to False, setting it to True because it can provide a huge speedup on GPUs. "
+                "It is possible to disable this feature manually by setting the use_io_binding attribute back to False."
+            )
 
-        if self.vae_encoder is not None:
-            self.vae_encoder.session.set_providers([provider], provider_options=[provider_options])
-        if self.text_encoder is not None:
-            self.text_encoder.session.set_providers([provider], provider_options=[provider_options])
-        if self.text_encoder_2 is not None:
-            self.text_encoder_2.session.set_providers([provider], provider_options=[provider_options])
+        if provider == "ROCMExecutionProvider":
+            self.use_io_binding = False
+
+        for model in (self.unet, self.vae_decoder, self.vae_encoder, self.text_encoder, self.text_encoder_2):
+            if model is not None:
+                model.session.set_providers([provider], provider_options=[provider_options])
+                model._init_io_binding()
 
         self.providers = self.unet.session.get_providers()
         self._device = device
 
         return self
 
+    @property
+    def dtype(self) -> torch.dtype:
+        """
+        `torch.dtype`: The dtype of the pipeline, which is the one of its UNet.
+        """
+        return self.unet.dtype
+
     @classmethod
     def _load_config(cls, config_name_or_path: Union[str, os.PathLike], **kwargs):
         return cls.load_config(config_name_or_path, **kwargs)
@@ -424,14 +568,40 @@ class ORTDiffusionPipeline(ORTModel, DiffusionPipeline):
         # we do this to keep numpy random states support for now
         # TODO: deprecate and add warnings when a random state is passed
 
-        args = list(args)
-        for i in range(len(args)):
-            args[i] = np_to_pt_generators(args[i], self.device)
+        device = self.device
+        args = tuple(np_to_pt_generators(arg, device) for arg in args)
+        kwargs = {key: np_to_pt_generators(value, device) for key, value in kwargs.items()}
 
-        for k, v in kwargs.items():
-            kwargs[k] = np_to_pt_generators(v, self.device)
+        try:
+            return self.auto_model_class.__call__(self, *args, **kwargs)
+        finally:
+            # the inputs converted during this call are not assumed unchanged at the next one
+            for model in (self.unet, self.text_encoder, self.text_encoder_2, self.vae_encoder, self.vae_decoder):
+                if model is not None:
+                    model._converted_inputs.clear()
 
-        return self.auto_model_class.__call__(self, *args, **kwargs)
+
+class _ResolvedTypes(dict):
+    """
+    Mapping from the names of the inputs or outputs of a session to their types resolved with `resolve_type`, which is
+    called on the first lookup of each name. `get` returns the default for the types `resolve_type` does not support.
+    """
+
+    def __init__(self, ort_types: Dict[str, str], resolve_type):
+        super().__init__()
+        self._ort_types = ort_types
+        self._resolve_type = resolve_type
+
+    def __missing__(self, name: str):
+        resolved_type = self._resolve_type(self._ort_types[name])
+        self[name] = resolved_type
+        return resolved_type
+
+    def get(self, name: str, default=None):
+        try:
+            return self[name]
+        except (KeyError, ValueError):
+            return default
 
 
 class ORTPipelinePart(ConfigMixin):
@@ -445,6 +615,38 @@ class ORTPipelinePart(ConfigMixin):
         self.output_names = {output_key.name: idx for idx, output_key in enumerate(self.session.get_outputs())}
         self.input_dtypes = {input_key.name: input_key.type for input_key in self.session.get_inputs()}
         self.output_dtypes = {output_key.name: output_key.type for output_key in self.session.get_outputs()}
+        self.input_shapes = {input_key.name: input_key.shape for input_key in self.session.get_inputs()}
+        self.output_shapes = {output_key.name: output_key.shape for output_key in self.session.get_outputs()}
+
+        # the ONNX Runtime types are resolved once, as they are looked up for each input and output at every call,
+        # and lazily, as a model may have inputs or outputs of types that are not supported but never bound
+        self._input_torch_dtypes = _ResolvedTypes(self.input_dtypes, TypeHelper.ort_type_to_torch_type)
+        self._input_numpy_dtypes = _ResolvedTypes(self.input_dtypes, TypeHelper.ort_type_to_numpy_type)
+        self._output_torch_dtypes = _ResolvedTypes(self.output_dtypes, TypeHelper.ort_type_to_torch_type)
+        self._output_numpy_dtypes = _ResolvedTypes(self.output_dtypes, TypeHelper.ort_type_to_numpy_type)
+
+        # the symbolic output axes are compiled once, to be resolved from the inputs dimensions at each call
+        self._compiled_output_shapes = {
+            output_name: tuple(
+                _compile_axis_expression(axis_name) if isinstance(axis_name, str) else axis_name
+                for axis_name in output_shape
+            )
+            for output_name, output_shape in self.output_shapes.items()
+        }
+
+        self._warned_about_host_copies = False
+
+        # the IOBinding object and the buffers of a part are shared by all its calls, which are serialized in case they
+        # come from several threads (e.g. with `ORTModelUnet.forward_async`)
+        self._io_binding_lock = threading.Lock()
+
+        # parsing the model for its external data files is slow for large models, it is done once when saving
+        self._external_data_paths = None
+
+        # the dtype of a session can not change, it is resolved once as diffusers reads it at each denoising step
+        self._dtype = self._get_session_dtype()
+
+        self._init_io_binding()
 
         config_file_path = Path(session._model_path).parent / self.config_name
         if not config_file_path.is_file():
@@ -453,24 +655,54 @@ class ORTPipelinePart(ConfigMixin):
         config_dict = self._dict_from_json_file(config_file_path)
         self.register_to_config(**config_dict)
 
+    def _init_io_binding(self):
+        # a single IOBinding object is reused across calls, its outputs being bound again at each call and its inputs
+        # only when they change.
+        # It is tied to the session it was created from, and has to be re-created when the session providers change.
+        self._io_binding = self.session.io_binding()
+
+        # a CUDA graph replays the kernels captured during the first run on the same memory addresses, so the inputs
+        # are copied to and the outputs written in persistent buffers
+        cuda_provider_options = self.session.get_provider_options().get("CUDAExecutionProvider", {})
+        self._use_cuda_graph = cuda_provider_options.get("enable_cuda_graph", "0") == "1"
+        self._input_buffers = {}
+        self._output_buffers = {}
+        self._output_shapes_cache = {}
+        self._bound_inputs = {}
+        self._converted_inputs = {}
+
     @property
     def device(self):
         return self.parent_pipeline.device
 
     @property
-    def dtype(self):
-        for dtype in self.input_dtypes.values():
-            torch_dtype = TypeHelper.ort_type_to_torch_type(dtype)
-            if torch_dtype.is_floating_point:
+    def use_io_binding(self):
+        return self.parent_pipeline.use_io_binding
+
+    def _get_external_data_paths(self) -> List[Path]:
+        if self._external_data_paths is None:
+            model_path = Path(self.session._model_path)
+            # the tensors of a model usually share a single external data file, which is listed once
+            self._external_data_paths = list(dict.fromkeys(_get_model_external_data_paths(model_path)))
+        return self._external_data_paths
+
+    def _get_session_dtype(self) -> Optional[torch.dtype]:
+        for input_name in self.input_dtypes.keys():
+            torch_dtype = self._input_torch_dtypes.get(input_name, None)
+            if torch_dtype is not None and torch_dtype.is_floating_point:
                 return torch_dtype
 
-        for dtype in self.output_dtypes.values():
-            torch_dtype = TypeHelper.ort_type_to_torch_type(dtype)
-            if torch_dtype.is_floating_point:
+        for output_name in self.output_dtypes.keys():
+            torch_dtype = self._output_torch_dtypes.get(output_name, None)
+            if torch_dtype is not None and torch_dtype.is_floating_point:
                 return torch_dtype
 
         return None
 
+    @property
+    def dtype(self):
+        return self._dtype
+
     def to(self, *args, device: Optional[Union[torch.device, str, int]] = None, dtype: Optional[torch.dtype] = None):
         for arg in args:
             if isinstance(arg, torch.device):
@@ -500,26 +732,244 @@ class ORTPipelinePart(ConfigMixin):
             onnx_inputs[input_name] = inputs.pop(input_name)
 
             if use_torch:
-                onnx_inputs[input_name] = onnx_inputs[input_name].numpy(force=True)
-
-            if onnx_inputs[input_name].dtype != self.input_dtypes[input_name]:
-                onnx_inputs[input_name] = onnx_inputs[input_name].astype(
-                    TypeHelper.ort_type_to_numpy_type(self.input_dtypes[input_name])
-                )
+                if onnx_inputs[input_name].is_cuda and not self._warned_about_host_copies:
+                    logger.warning(
+                        f"{self.__class__.__name__} received CUDA tensors while IO binding is disabled, they are copied "
+                        "to the host before inference and the outputs are copied back to the device. Please set "
+                        "`pipeline.use_io_binding = True` to keep them on the device."
+                    )
+                    self._warned_about_host_copies = True
+
+                # casting before the conversion avoids a second copy, and a contiguous cpu tensor with the expected
+                # dtype is converted to numpy without any copy
+                torch_dtype = self._input_torch_dtypes[input_name]
+                onnx_inputs[input_name] = onnx_inputs[input_name].to(dtype=torch_dtype).numpy(force=True)
+            else:
+                numpy_dtype = self._input_numpy_dtypes[input_name]
+                if onnx_inputs[input_name].dtype != numpy_dtype:
+                    onnx_inputs[input_name] = onnx_inputs[input_name].astype(numpy_dtype)
 
         return onnx_inputs
 
     def prepare_onnx_outputs(
-        self, use_torch: bool, *onnx_outputs: np.ndarray
+        self, use_torch: bool, *onnx_outputs: np.ndarray, output_names: Optional[List[str]] = None
     ) -> Dict[str, Union[torch.Tensor, np.ndarray]]:
         model_outputs = {}
 
+        # the outputs are in the order of the session outputs, unless only some of them were requested
+        if output_names is None:
+            output_names = self.output_names.keys()
+
         # converts onnxruntime outputs into tensor for standard outputs
-        for output_name, idx in self.output_names.items():
-            model_outputs[output_name] = onnx_outputs[idx]
+        for output_name, onnx_output in zip(output_names, onnx_outputs):
+            model_outputs[output_name] = onnx_output
 
             if use_torch:
-                model_outputs[output_name] = torch.from_numpy(model_outputs[output_name]).to(self.device)
+                model_outputs[output_name] = torch.from_numpy(model_outputs[output_name])
+                if self.device.type != "cpu":
+                    model_outputs[output_name] = model_outputs[output_name].to(self.device)
+
+        return model_outputs
+
+    def _output_shape_inference(self, output_name: str, dimensions: Dict[str, int]) -> Tuple[Union[int, str], ...]:
+        """
+        Infers the shape of an output from the `dimensions` mapping of the inputs dynamic axes. The axes that can not
+        be inferred are returned as is.
+        """
+        output_shape = []
+        compiled_output_shape = self._compiled_output_shapes[output_name]
+        for axis_name, compiled_axis in zip(self.output_shapes[output_name], compiled_output_shape):
+            if not isinstance(compiled_axis, tuple):
+                output_shape.append(compiled_axis)
+                continue
+
+            axis_symbols, axis_expression = compiled_axis
+            if axis_expression is None or any(symbol not in dimensions for symbol in axis_symbols):
+                output_shape.append(axis_name)
+            else:
+                output_shape.append(int(axis_expression(dimensions)))
+
+        return tuple(output_shape)
+
+    def _get_output_shapes(
+        self, dimensions: Dict[str, int], known_output_shapes: Optional[Dict[str, Tuple[int]]] = None
+    ) -> Dict[str, Tuple[int, ...]]:
+        if known_output_shapes is None:
+            known_output_shapes = {}
+
+        output_shapes = {}
+        for output_name in self.output_names.keys():
+            if output_name in known_output_shapes:
+                output_shape = tuple(known_output_shapes[output_name])
+            else:
+                output_shape = self._output_shape_inference(output_name, dimensions)
+
+            if not all(isinstance(axis, int) for axis in output_shape):
+                raise ValueError(
+                    f"Could not infer the shape of the output {output_name} of {self.__class__.__name__}, got "
+                    f"{output_shape}. Please disable IO binding with `pipeline.use_io_binding = False`."
+                )
+            output_shapes[output_name] = output_shape
+
+        return output_shapes
+
+    def _prepare_io_binding(
+        self,
+        model_inputs: Dict[str, torch.Tensor],
+        known_output_shapes: Optional[Dict[str, Tuple[int]]] = None,
+        output_names: Optional[List[str]] = None,
+    ) -> Tuple[ort.IOBinding, Dict[str, torch.Tensor]]:
+        """
+        Binds the inputs and outputs of the model to the IOBinding object of the session, which is reused across calls.
+
+        Args:
+            model_inputs (`Dict[str, torch.Tensor]`):
+                The inputs of the model. The inputs that need to be moved to the device or casted to the dtype
+                expected by the session are copied to persistent input buffers, which replace them in place.
+            known_output_shapes (`Optional[Dict[str, Tuple[int]]]`, defaults to `None`):
+                The shapes of the outputs that can not be inferred from the dynamic axes of the inputs.
+            output_names (`Optional[List[str]]`, defaults to `None`):
+                The outputs to bind, all the outputs of the session being bound by default. ONNX Runtime does not
+                allocate nor copy the outputs that are not bound.
+
+        Returns:
+            `Tuple[ort.IOBinding, Dict[str, torch.Tensor]]`: The IOBinding object and the buffers the outputs will be
+            written to.
+        """
+        io_binding = self._io_binding
+
+        if self._use_cuda_graph and self._output_buffers:
+            # the buffers of a CUDA graph are bound at the first call and never move, only the inputs are copied
+            for input_name, input_buffer in self._input_buffers.items():
+                model_input = model_inputs[input_name]
+                if input_buffer.shape != model_input.shape:
+                    raise ValueError(
+                        f"{self.__class__.__name__} was captured in a CUDA graph with an input {input_name} of shape "
+                        f"{tuple(input_buffer.shape)}, but got {tuple(model_input.shape)}. The inputs shapes can not "
+                        "change when using CUDA graphs."
+                    )
+                input_buffer.copy_(model_input, non_blocking=True)
+            return io_binding, dict(self._output_buffers)
+
+        io_binding.clear_binding_outputs()
+
+        device_id = IOBindingHelper.get_device_index(self.device)
+
+        dimensions = {}
+        for input_name in self.input_names.keys():
+            torch_dtype = self._input_torch_dtypes[input_name]
+
+            model_input = model_inputs[input_name]
+            if (
+                self._use_cuda_graph
+                or model_input.dtype != torch_dtype
+                or model_input.device != self.device
+                or not model_input.is_contiguous()
+            ):
+                # the inputs that need to be converted are copied to buffers persisting across calls, instead of
+                # allocating new tensors at each denoising step
+                input_buffer = self._input_buffers.get(input_name, None)
+                if input_buffer is None or input_buffer.shape != model_input.shape:
+                    input_buffer = torch.empty(model_input.shape, dtype=torch_dtype, device=self.device)
+                    self._input_buffers[input_name] = input_buffer
+                    self._converted_inputs.pop(input_name, None)
+
+                # an input that was already converted at the previous call and was not modified since (e.g. the
+                # prompt embeddings during denoising) is not converted again. The source tensor is weakly referenced,
+                # not to keep it alive, and the cache is cleared after each pipeline call, as the version counter
+                # of a tensor is not bumped by writes bypassing autograd (e.g. through `.data` or a numpy view).
+                # The tensors created in inference mode have no version counter, and are converted at each call
+                is_inference_input = model_input.is_inference()
+                converted_input = None if is_inference_input else self._converted_inputs.get(input_name, None)
+                if (
+                    converted_input is None
+                    or converted_input[0]() is not model_input
+                    or converted_input[1] != model_input._version
+                ):
+                    input_buffer.copy_(model_input, non_blocking=True)
+                    if is_inference_input:
+                        self._converted_inputs.pop(input_name, None)
+                    else:
+                        self._converted_inputs[input_name] = (weakref.ref(model_input), model_input._version)
+                model_input = input_buffer
+            model_inputs[input_name] = model_input
+
+            for idx, axis_name in enumerate(self.input_shapes[input_name]):
+                if isinstance(axis_name, str):
+                    dimensions[axis_name] = model_input.shape[idx]
+
+            # the inputs that are constant across denoising steps (e.g. the prompt embeddings) are bound once, binding
+            # an input again replacing its previous binding
+            input_binding = (model_input.data_ptr(), tuple(model_input.shape))
+            if self._bound_inputs.get(input_name, None) != input_binding:
+                io_binding.bind_input(
+                    input_name,
+                    model_input.device.type,
+                    device_id,
+                    self._input_numpy_dtypes[input_name],
+                    input_binding[1],
+                    input_binding[0],
+                )
+                self._bound_inputs[input_name] = input_binding
+
+        # the output shapes only depend on the inputs shapes, which are the same at each denoising step and only take
+        # a few values across calls (e.g. with and without classifier free guidance)
+        input_shapes = tuple(model_inputs[input_name].shape for input_name in self.input_names.keys())
+        output_shapes = self._output_shapes_cache.get(input_shapes, None)
+        if output_shapes is None:
+            if len(self._output_shapes_cache) >= _OUTPUT_SHAPES_CACHE_SIZE:
+                # evicts the oldest entry
+                self._output_shapes_cache.pop(next(iter(self._output_shapes_cache)))
+            output_shapes = self._get_output_shapes(dimensions, known_output_shapes)
+            self._output_shapes_cache[input_shapes] = output_shapes
+
+        if output_names is None:
+            output_names = self.output_names.keys()
+
+        output_buffers = {}
+        for output_name in output_names:
+            output_shape = output_shapes[output_name]
+            torch_dtype = self._output_torch_dtypes[output_name]
+            # the buffers are kept contiguous (NCHW for 4D outputs): ONNX Runtime writes the outputs with the layout of
+            # the graph outputs, the NHWC kernels it may use internally being wrapped in transposes inside the graph
+            if self._use_cuda_graph:
+                output_buffer = self._output_buffers.get(output_name, None)
+                if output_buffer is None:
+                    output_buffer = torch.empty(output_shape, dtype=torch_dtype, device=self.device)
+                    self._output_buffers[output_name] = output_buffer
+            else:
+                output_buffer = torch.empty(output_shape, dtype=torch_dtype, device=self.device)
+
+            io_binding.bind_output(
+                output_name,
+                output_buffer.device.type,
+                device_id,
+                self._output_numpy_dtypes[output_name],
+                output_shape,
+                output_buffer.data_ptr(),
+            )
+            output_buffers[output_name] = output_buffer
+
+        return io_binding, output_buffers
+
+    def run_with_io_binding(
+        self,
+        model_inputs: Dict[str, torch.Tensor],
+        known_output_shapes: Optional[Dict[str, Tuple[int]]] = None,
+        output_names: Optional[List[str]] = None,
+    ) -> Dict[str, torch.Tensor]:
+        with self._io_binding_lock:
+            io_binding, model_outputs = self._prepare_io_binding(model_inputs, known_output_shapes, output_names)
+
+            # run inference with binding & synchronize in case of multiple CUDA streams
+            io_binding.synchronize_inputs()
+            self.session.run_with_iobinding(io_binding)
+            io_binding.synchronize_outputs()
+
+            if self._use_cuda_graph:
+                # the persistent buffers of the graph are overwritten at each replay, while diffusers may keep the
+                # outputs of the previous steps (e.g. the PNDM scheduler), so the outputs are returned as copies
+                model_outputs = {output_name: output.clone() for output_name, output in model_outputs.items()}
 
         return model_outputs
 
@@ -532,6 +982,14 @@ class ORTPipelinePart(ConfigMixin):
 
 
 class ORTModelUnet(ORTPipelinePart):
+    """
+    UNet of a diffusion pipeline, run with ONNX Runtime.
+
+    When the pipeline is loaded with `enable_cuda_graph=True`, the UNet session is captured in a CUDA graph during its
+    first run and replayed at the following ones. The inputs shapes can then not change between calls (the pipeline
+    has to be re-loaded to generate images of another size or batch size).
+    """
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -543,6 +1001,25 @@ class ORTModelUnet(ORTPipelinePart):
             )
             self.register_to_config(time_cond_proj_dim=None)
 
+        # the worker thread of `forward_async` is only started when it is first used
+        self._executor = None
+
+    def forward_async(self, *args, **kwargs) -> Future:
+        """
+        Runs `forward` in a background thread and returns a `concurrent.futures.Future` of its outputs, leaving the
+        calling thread free to prepare the next step while the UNet runs, as ONNX Runtime releases the GIL during
+        inference.
+
+        The calls are run one at a time in the order they were made, and the calls made meanwhile through `forward`
+        wait for the running one to finish using the IOBinding of the session. The inputs must not be modified before
+        the future is resolved.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ort_unet")
+            # the worker thread is stopped once the UNet is garbage collected
+            weakref.finalize(self, self._executor.shutdown, wait=False)
+        return self._executor.submit(self.forward, *args, **kwargs)
+
     def forward(
         self,
         sample: Union[np.ndarray, torch.Tensor],
@@ -556,24 +1033,33 @@ class ORTModelUnet(ORTPipelinePart):
         return_dict: bool = False,
     ):
         use_torch = isinstance(sample, torch.Tensor)
+        self.parent_pipeline.raise_on_numpy_input_io_binding(use_torch)
 
-        if len(timestep.shape) == 0:
-            timestep = timestep.unsqueeze(0)
-
-        model_inputs = {
-            "sample": sample,
-            "timestep": timestep,
-            "encoder_hidden_states": encoder_hidden_states,
-            "text_embeds": text_embeds,
-            "time_ids": time_ids,
-            "timestep_cond": timestep_cond,
-            **(cross_attention_kwargs or {}),
-            **(added_cond_kwargs or {}),
-        }
+        if timestep.ndim == 0:
+            # indexing adds the batch axis as a view, for numpy arrays (which have no unsqueeze) as well as tensors
+            timestep = timestep[None]
+
+        model_inputs = {"sample": sample, "timestep": timestep, "encoder_hidden_states": encoder_hidden_states}
+
+        # the conditioning inputs are only gathered when the exported UNet takes them
+        if "text_embeds" in self.input_names:
+            model_inputs["text_embeds"] = text_embeds
+        if "time_ids" in self.input_names:
+            model_inputs["time_ids"] = time_ids
+        if "timestep_cond" in self.input_names:
+            model_inputs["timestep_cond"] = timestep_cond
 
-        onnx_inputs = self.prepare_onnx_inputs(use_torch, **model_inputs)
-        onnx_outputs = self.session.run(None, onnx_inputs)
-        model_outputs = self.prepare_onnx_outputs(use_torch, *onnx_outputs)
+        if cross_attention_kwargs:
+            model_inputs.update(cross_attention_kwargs)
+        if added_cond_kwargs:
+            model_inputs.update(added_cond_kwargs)
+
+        if self.device.type == "cuda" and self.use_io_binding:
+            model_outputs = self.run_with_io_binding(model_inputs)
+        else:
+            onnx_inputs = self.prepare_onnx_inputs(use_torch, **model_inputs)
+            onnx_outputs = self.session.run(None, onnx_inputs)
+            model_outputs = self.prepare_onnx_outputs(use_torch, *onnx_outputs)
 
         if return_dict:
             return model_outputs
@@ -582,6 +1068,14 @@ class ORTModelUnet(ORTPipelinePart):
 
 
 class ORTModelTextEncoder(ORTPipelinePart):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # the hidden states of every layer are only fetched when requested
+        self._default_output_names = [
+            output_name for output_name in self.output_names.keys() if not output_name.startswith("hidden_states.")
+        ]
+
     def forward(
         self,
         input_ids: Union[np.ndarray, torch.Tensor],
@@ -590,12 +1084,22 @@ class ORTModelTextEncoder(ORTPipelinePart):
         return_dict: bool = False,
     ):
         use_torch = isinstance(input_ids, torch.Tensor)
+        self.parent_pipeline.raise_on_numpy_input_io_binding(use_torch)
 
         model_inputs = {"input_ids": input_ids}
+        output_names = None if output_hidden_states else self._default_output_names
+
+        if self.device.type == "cuda" and self.use_io_binding:
+            known_output_shapes = None
+            if "text_embeds" in self.output_names:
+                # the projection axis of text_embeds is exported with the same name as the sequence length axis
+                known_output_shapes = {"text_embeds": (input_ids.shape[0], self.config.projection_dim)}
 
-        onnx_inputs = self.prepare_onnx_inputs(use_torch, **model_inputs)
-        onnx_outputs = self.session.run(None, onnx_inputs)
-        model_outputs = self.prepare_onnx_outputs(use_torch, *onnx_outputs)
+            model_outputs = self.run_with_io_binding(model_inputs, known_output_shapes, output_names)
+        else:
+            onnx_inputs = self.prepare_onnx_inputs(use_torch, **model_inputs)
+            onnx_outputs = self.session.run(output_names, onnx_inputs)
+            model_outputs = self.prepare_onnx_outputs(use_torch, *onnx_outputs, output_names=output_names)
 
         if output_hidden_states:
             model_outputs["hidden_states"] = []
@@ -612,6 +1116,37 @@ class ORTModelTextEncoder(ORTPipelinePart):
         return ModelOutput(**model_outputs)
 
 
+class LazyDiagonalGaussianDistribution(DiagonalGaussianDistribution):
+    """
+    Latent distribution of the VAE encoder, computing its statistics on first access only. The pipelines only sample
+    the latents or take their mode, which does not require the variance.
+    """
+
+    def __init__(self, parameters: torch.Tensor, deterministic: bool = False):
+        self.parameters = parameters
+        self.deterministic = deterministic
+
+    @cached_property
+    def mean(self) -> torch.Tensor:
+        return torch.chunk(self.parameters, 2, dim=1)[0]
+
+    @cached_property
+    def logvar(self) -> torch.Tensor:
+        return torch.clamp(torch.chunk(self.parameters, 2, dim=1)[1], -30.0, 20.0)
+
+    @cached_property
+    def std(self) -> torch.Tensor:
+        if self.deterministic:
+            return torch.zeros_like(self.mean)
+        return torch.exp(0.5 * self.logvar)
+
+    @cached_property
+    def var(self) -> torch.Tensor:
+        if self.deterministic:
+            return torch.zeros_like(self.mean)
+        return torch.exp(self.logvar)
+
+
 class ORTModelVaeEncoder(ORTPipelinePart):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -631,18 +1166,31 @@ class ORTModelVaeEncoder(ORTPipelinePart):
         return_dict: bool = False,
     ):
         use_torch = isinstance(sample, torch.Tensor)
+        self.parent_pipeline.raise_on_numpy_input_io_binding(use_torch)
 
         model_inputs = {"sample": sample}
 
-        onnx_inputs = self.prepare_onnx_inputs(use_torch, **model_inputs)
-        onnx_outputs = self.session.run(None, onnx_inputs)
-        model_outputs = self.prepare_onnx_outputs(use_torch, *onnx_outputs)
+        if self.device.type == "cuda" and self.use_io_binding:
+            # the spatial axes of the latents are not expressed in terms of the input axes
+            batch_size, _, height, width = sample.shape
+            scale_factor = 2 ** (len(self.config.block_out_channels) - 1)
+            latent_shape = (batch_size, self.config.latent_channels, height // scale_factor, width // scale_factor)
+            known_output_shapes = {
+                "latent_sample": latent_shape,
+                "latent_parameters": (latent_shape[0], 2 * latent_shape[1], *latent_shape[2:]),
+            }
+
+            model_outputs = self.run_with_io_binding(model_inputs, known_output_shapes)
+        else:
+            onnx_inputs = self.prepare_onnx_inputs(use_torch, **model_inputs)
+            onnx_outputs = self.session.run(None, onnx_inputs)
+            model_outputs = self.prepare_onnx_outputs(use_torch, *onnx_outputs)
 
         if "latent_sample" in model_outputs:
             model_outputs["latents"] = model_outputs.pop("latent_sample")
 
         if "latent_parameters" in model_outputs:
-            model_outputs["latent_dist"] = DiagonalGaussianDistribution(
+            model_outputs["latent_dist"] = LazyDiagonalGaussianDistribution(
                 parameters=model_outputs.pop("latent_parameters")
             )
 
@@ -671,12 +1219,23 @@ class ORTModelVaeDecoder(ORTPipelinePart):
         return_dict: bool = False,
     ):
         use_torch = isinstance(latent_sample, torch.Tensor)
+        self.parent_pipeline.raise_on_numpy_input_io_binding(use_torch)
 
         model_inputs = {"latent_sample": latent_sample}
 
-        onnx_inputs = self.prepare_onnx_inputs(use_torch, **model_inputs)
-        onnx_outputs = self.session.run(None, onnx_inputs)
-        model_outputs = self.prepare_onnx_outputs(use_torch, *onnx_outputs)
+        if self.device.type == "cuda" and self.use_io_binding:
+            # the spatial axes of the sample are not expressed in terms of the input axes
+            batch_size, _, height, width = latent_sample.shape
+            scale_factor = 2 ** (len(self.config.block_out_channels) - 1)
+            known_output_shapes = {
+                "sample": (batch_size, self.config.out_channels, height * scale_factor, width * scale_factor)
+            }
+
+            model_outputs = self.run_with_io_binding(model_inputs, known_output_shapes)
+        else:
+            onnx_inputs = self.prepare_onnx_inputs(use_torch, **model_inputs)
+            onnx_outputs = self.session.run(None, onnx_inputs)
+            model_outputs = self.prepare_onnx_outputs(use_torch, *onnx_outputs)
 
         if "latent_sample" in model_outputs:
             model_outputs["latents"] = model_outputs.pop("latent_sample")
@@ -692,6 +1251,15 @@ class ORTWrapperVae(ORTPipelinePart):
         self.decoder = decoder
         self.encoder = encoder
 
+        # same tiling defaults as diffusers' AutoencoderKL
+        sample_size = getattr(self.decoder.config, "sample_size", 32)
+        if isinstance(sample_size, (list, tuple)):
+            sample_size = sample_size[0]
+        self.use_tiling = False
+        self.tile_sample_min_size = sample_size
+        self.tile_latent_min_size = int(sample_size / (2 ** (len(self.decoder.config.block_out_channels) - 1)))
+        self.tile_overlap_factor = 0.25
+
     @property
     def config(self):
         return self.decoder.config
@@ -704,9 +1272,90 @@ class ORTWrapperVae(ORTPipelinePart):
     def device(self):
         return self.decoder.device
 
+    def enable_tiling(self, use_tiling: bool = True):
+        """
+        Enables the tiled VAE decoding, used by `pipeline.enable_vae_tiling()`. The latents are split into overlapping
+        tiles decoded one at a time, which caps the memory used by the decoder activations for large images at the
+        cost of some overhead from the overlaps.
+        """
+        self.use_tiling = use_tiling
+
+    def disable_tiling(self):
+        """
+        Disables the tiled VAE decoding, used by `pipeline.disable_vae_tiling()`.
+        """
+        self.enable_tiling(False)
+
     def decode(self, *args, **kwargs):
+        if self.use_tiling:
+            return self.tiled_decode(*args, **kwargs)
         return self.decoder(*args, **kwargs)
 
+    def tiled_decode(
+        self,
+        latent_sample: Union[np.ndarray, torch.Tensor],
+        generator: Optional[torch.Generator] = None,
+        return_dict: bool = False,
+    ):
+        """
+        Decodes the latents tile by tile, blending the overlapping edges of neighboring tiles, as in diffusers'
+        `AutoencoderKL.tiled_decode`. The latents fitting in a single tile are decoded at once.
+        """
+        if not isinstance(latent_sample, torch.Tensor) or (
+            latent_sample.shape[-1] <= self.tile_latent_min_size
+            and latent_sample.shape[-2] <= self.tile_latent_min_size
+        ):
+            return self.decoder(latent_sample, generator=generator, return_dict=return_dict)
+
+        overlap_size = int(self.tile_latent_min_size * (1 - self.tile_overlap_factor))
+        blend_extent = int(self.tile_sample_min_size * self.tile_overlap_factor)
+        row_limit = self.tile_sample_min_size - blend_extent
+
+        rows = []
+        for i in range(0, latent_sample.shape[2], overlap_size):
+            row = []
+            for j in range(0, latent_sample.shape[3], overlap_size):
+                tile = latent_sample[:, :, i : i + self.tile_latent_min_size, j : j + self.tile_latent_min_size]
+                row.append(self.decoder(tile, generator=generator, return_dict=True)["sample"])
+            rows.append(row)
+
+        result_rows = []
+        for i, row in enumerate(rows):
+            result_row = []
+            for j, tile in enumerate(row):
+                if i > 0:
+                    tile = self._blend(rows[i - 1][j], tile, blend_extent, dim=2)
+                if j > 0:
+                    tile = self._blend(row[j - 1], tile, blend_extent, dim=3)
+                result_row.append(tile[:, :, :row_limit, :row_limit])
+            result_rows.append(torch.cat(result_row, dim=3))
+
+        model_outputs = {"sample": torch.cat(result_rows, dim=2)}
+
+        if return_dict:
+            return model_outputs
+
+        return ModelOutput(**model_outputs)
+
+    @staticmethod
+    def _blend(previous_tile: torch.Tensor, tile: torch.Tensor, blend_extent: int, dim: int) -> torch.Tensor:
+        """
+        Linearly blends the leading edge of `tile` along `dim` with the trailing edge of `previous_tile`, in place.
+        """
+        blend_extent = min(previous_tile.shape[dim], tile.shape[dim], blend_extent)
+        if blend_extent == 0:
+            return tile
+
+        weights_shape = [1] * tile.ndim
+        weights_shape[dim] = blend_extent
+        weights = (torch.arange(blend_extent, device=tile.device) / blend_extent).to(tile.dtype).view(weights_shape)
+
+        previous_edge = previous_tile.narrow(dim, previous_tile.shape[dim] - blend_extent, blend_extent)
+        edge = tile.narrow(dim, 0, blend_extent)
+        edge.copy_(previous_edge * (1 - weights) + edge * weights)
+
+        return tile
+
     def encode(self, *args, **kwargs):
         return self.encoder(*args, **kwargs)
 
@@ -883,13 +1532,19 @@ SUPPORTED_ORT_PIPELINES = [
 ]
 
 
+# maps the names of the ORT pipelines and of their diffusers counterparts to the ORT pipelines, iterating in reverse so
+# that the first pipeline matching a name takes precedence
+_ORT_PIPELINE_CLASSES = {
+    pipeline_class_name: ort_pipeline_class
+    for ort_pipeline_class in reversed(SUPPORTED_ORT_PIPELINES)
+    for pipeline_class_name in (ort_pipeline_class.__name__, ort_pipeline_class.auto_model_class.__name__)
+}
+
+
 def _get_ort_class(pipeline_class_name: str, throw_error_if_not_exist: bool = True):
-    for ort_pipeline_class in SUPPORTED_ORT_PIPELINES:
-        if (
-            ort_pipeline_class.__name__ == pipeline_class_name
-            or ort_pipeline_class.auto_model_class.__name__ == pipeline_class_name
-        ):
-            return ort_pipeline_class
+    ort_pipeline_class = _ORT_PIPELINE_CLASSES.get(pipeline_class_name, None)
+    if ort_pipeline_class is not None:
+        return ort_pipeline_class
 
     if throw_error_if_not_exist:
         raise ValueError(f"ORTDiffusionPipeline can't find a pipeline linked to {pipeline_class_name}")
@@ -925,17 +1580,18 @@ SUPPORTED_ORT_PIPELINES_MAPPINGS = [
 ]
 
 
-def _get_task_ort_class(mapping, pipeline_class_name):
-    def _get_model_name(pipeline_class_name):
-        for ort_pipelines_mapping in SUPPORTED_ORT_PIPELINES_MAPPINGS:
-            for model_name, ort_pipeline_class in ort_pipelines_mapping.items():
-                if (
-                    ort_pipeline_class.__name__ == pipeline_class_name
-                    or ort_pipeline_class.auto_model_class.__name__ == pipeline_class_name
-                ):
-                    return model_name
+# maps the names of the ORT pipelines and of their diffusers counterparts to their model name, iterating in reverse so
+# that the first mapping entry matching a name takes precedence
+_ORT_PIPELINE_MODEL_NAMES = {
+    pipeline_class_name: model_name
+    for ort_pipelines_mapping in reversed(SUPPORTED_ORT_PIPELINES_MAPPINGS)
+    for model_name, ort_pipeline_class in reversed(ort_pipelines_mapping.items())
+    for pipeline_class_name in (ort_pipeline_class.__name__, ort_pipeline_class.auto_model_class.__name__)
+}
+
 
-    model_name = _get_model_name(pipeline_class_name)
+def _get_task_ort_class(mapping, pipeline_class_name):
+    model_name = _ORT_PIPELINE_MODEL_NAMES.get(pipeline_class_name, None)
 
     if model_name is not None:
         task_class = mapping.get(model_name, None)
@@ -966,6 +1622,10 @@ class ORTPipelineForTask(ConfigMixin):
 
         ort_pipeline_class = _get_task_ort_class(cls.ort_pipelines_mapping, class_name)
 
+        if kwargs.get("config", None) is None and not kwargs.get("subfolder", ""):
+            # the model index loaded above is the one the pipeline would load, it is not read a second time
+            kwargs["config"] = config
+
         return ort_pipeline_class.from_pretrained(pretrained_model_or_path, **kwargs)
 
 
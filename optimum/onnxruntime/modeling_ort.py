@@ -14,12 +14,13 @@
 """ORTModelForXXX classes, allowing to run ONNX Models with ONNX Runtime using the same API as Transformers."""
 
 import logging
+import operator
 import re
 import shutil
 import warnings
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple, Union
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set, Tuple, Union
 
 import numpy as np
 import torch
@@ -132,6 +133,104 @@ ONNX_AUDIO_INPUTS_DOCSTRING = r"""
 """
 
 
+_AXIS_EXPRESSION_OPERATORS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "//": operator.floordiv,
+}
+
+
+def _bind_binary_operator(op, left, right):
+    return lambda values: op(left(values), right(values))
+
+
+def _parse_axis_expression(tokens: List[str]) -> Callable[[Dict[str, int]], Union[int, float]]:
+    """
+    Parses the tokens of a symbolic axis (e.g. `["past_sequence_length", "+", "1"]`) into a function computing the
+    value of the axis from the values of the axis names it references. Only integers, axis names, the `+`, `-`, `*`,
+    `/` and `//` operators and parenthesis are supported, any other token raises a `ValueError`.
+    """
+    position = 0
+
+    def peek() -> Optional[str]:
+        return tokens[position] if position < len(tokens) else None
+
+    def consume() -> str:
+        nonlocal position
+        if position >= len(tokens):
+            raise ValueError("Unexpected end of the axis expression.")
+        position += 1
+        return tokens[position - 1]
+
+    def parse_binary(parse_operand, operators):
+        left = parse_operand()
+        while peek() in operators:
+            op = consume()
+            # The tokenizer splits "//" in two "/" tokens.
+            if op == "/" and peek() == "/":
+                op += consume()
+            left = _bind_binary_operator(_AXIS_EXPRESSION_OPERATORS[op], left, parse_operand())
+        return left
+
+    def parse_expression():
+        return parse_binary(parse_term, ("+", "-"))
+
+    def parse_term():
+        return parse_binary(parse_factor, ("*", "/"))
+
+    def parse_factor():
+        token = consume()
+        if token == "(":
+            inner = parse_expression()
+            if consume() != ")":
+                raise ValueError("Unbalanced parenthesis in the axis expression.")
+            return inner
+        elif token == "-":
+            operand = parse_factor()
+            return lambda values: -operand(values)
+        elif token.isdigit():
+            constant = int(token)
+            return lambda values: constant
+        elif token.isidentifier():
+            return lambda values: values[token]
+        raise ValueError(f"Unexpected token {token} in the axis expression.")
+
+    expression = parse_expression()
+    if position != len(tokens):
+        raise ValueError(f"Unexpected token {tokens[position]} in the axis expression.")
+    return expression
+
+
+_OUTPUT_SHAPE_INFERENCE_PATTERN = re.compile(r"([a-zA-Z_]+)|([0-9]+)|([+-/*])|([\(\)])")
+
+
+def _compile_axis_expression(
+    axis_name: str, pattern: re.Pattern = _OUTPUT_SHAPE_INFERENCE_PATTERN
+) -> Tuple[Tuple[str, ...], Optional[Callable[[Dict[str, int]], Union[int, float]]]]:
+    """
+    Parses a symbolic axis into the tuple of axis names it depends on and a function computing the axis value given
+    the values of those axis names. The function is `None` if the axis is not a valid arithmetic expression.
+    """
+    # Tokens is going to be populated by iterating over every match for the pattern.
+    # This pattern matches 4 things: axis names, integer values, operators (+, -, *, /) and parenthesis.
+    tokens = []
+    axis_symbols = []
+    for match_ in re.finditer(pattern, axis_name):
+        symbol = match_.group(1)
+        if symbol is not None and symbol not in axis_symbols:
+            axis_symbols.append(symbol)
+        tokens.append(match_.group(0))
+
+    try:
+        axis_expression = _parse_axis_expression(tokens)
+    except ValueError:
+        axis_expression = None
+
+    return tuple(axis_symbols), axis_expression
+
+
 class classproperty:
     def __init__(self, getter):
         self.getter = getter
@@ -240,7 +339,9 @@ class ORTModel(OptimizedModel):
             self.auto_model_class.register(AutoConfig, self.__class__)
 
         # Define the pattern here to avoid recomputing it everytime.
-        self.output_shape_inference_pattern = re.compile(r"([a-zA-Z_]+)|([0-9]+)|([+-/*])|([\(\)])")
+        self.output_shape_inference_pattern = _OUTPUT_SHAPE_INFERENCE_PATTERN
+        # The symbolic output axes are the same at every call, so they are only parsed once and cached here.
+        self._compiled_output_axes = {}
 
     def __init__(
         self,
@@ -777,32 +878,35 @@ class ORTModel(OptimizedModel):
         elif axis_name in dimensions:
             return dimensions[axis_name]
 
-        # Tokens is going to be populated by iterating over every match for the self.output_shape_inference_pattern.
-        # This pattern matches 4 things: axis names, integer values, operators (+, -, *, /) and parenthesis.
-        tokens = []
-        for idx, match_ in enumerate(re.finditer(self.output_shape_inference_pattern, axis_name)):
-            groups = match_.groups()
-            matched_group = None
-            for idx, group in enumerate(groups):
-                if group is not None:
-                    matched_group = idx
-                    break
-
-            # For every match except an axis name, we simply append the content of the match to the tokens list.
-            # For an axis name, we check if it is specified in the `dimensions` dictionary. If for some reason it is
-            # not there, or its value not an integer, the shape inference process stops and we return the axis name as
-            # is.
-            if matched_group == 0:
-                dim = dimensions.get(groups[0], None)
-                if dim is None or not isinstance(dim, int):
-                    return axis_name
-                tokens.append(str(dim))
-            else:
-                tokens.append(groups[matched_group])
+        compiled_axis = self._compiled_output_axes.get(axis_name, None)
+        if compiled_axis is None:
+            compiled_axis = self._compile_output_axis(axis_name)
+            self._compiled_output_axes[axis_name] = compiled_axis
+        axis_symbols, axis_expression = compiled_axis
+
+        # If for some reason an axis name is not specified in the `dimensions` dictionary, or its value is not an
+        # integer, the shape inference process stops and we return the axis name as is.
+        symbol_values = {}
+        for symbol in axis_symbols:
+            dim = dimensions.get(symbol, None)
+            if dim is None or not isinstance(dim, int):
+                return axis_name
+            symbol_values[symbol] = dim
+
+        if axis_expression is None:
+            return axis_name
+
+        return int(axis_expression(symbol_values))
 
-        # Here it should not be problematic to use eval since anything not matching the pattern would trigger an
-        # exception.
-        return int(eval(" ".join(tokens)))
+    def _compile_output_axis(
+        self, axis_name: str
+    ) -> Tuple[Tuple[str, ...], Optional[Callable[[Dict[str, int]], Union[int, float]]]]:
+        """
+        Parses a symbolic output axis into the tuple of axis names it depends on and a function computing the axis
+        value given the values of those axis names. The function is `None` if the axis is not a valid arithmetic
+        expression.
+        """
+        return _compile_axis_expression(axis_name, self.output_shape_inference_pattern)
 
     # TODO: this method is bloated with state arguments (that are accesible using self) why ?
     def _prepare_io_binding(
@@ -936,12 +1040,14 @@ class ORTModel(OptimizedModel):
             onnx_inputs[input_name] = inputs.pop(input_name)
 
             if use_torch:
-                onnx_inputs[input_name] = onnx_inputs[input_name].numpy(force=True)
-
-            if onnx_inputs[input_name].dtype != self.input_dtypes[input_name]:
-                onnx_inputs[input_name] = onnx_inputs[input_name].astype(
-                    TypeHelper.ort_type_to_numpy_type(self.input_dtypes[input_name])
-                )
+                # casting before the conversion avoids a second copy, and a contiguous cpu tensor with the expected
+                # dtype is converted to numpy without any copy
+                torch_dtype = TypeHelper.ort_type_to_torch_type(self.input_dtypes[input_name])
+                onnx_inputs[input_name] = onnx_inputs[input_name].to(dtype=torch_dtype).numpy(force=True)
+            else:
+                numpy_dtype = TypeHelper.ort_type_to_numpy_type(self.input_dtypes[input_name])
+                if onnx_inputs[input_name].dtype != numpy_dtype:
+                    onnx_inputs[input_name] = onnx_inputs[input_name].astype(numpy_dtype)
 
         return onnx_inputs
 
@@ -955,7 +1061,9 @@ class ORTModel(OptimizedModel):
             model_outputs[output_name] = onnx_outputs[idx]
 
             if use_torch:
-                model_outputs[output_name] = torch.from_numpy(model_outputs[output_name]).to(self.device)
+                model_outputs[output_name] = torch.from_numpy(model_outputs[output_name])
+                if self.device.type != "cpu":
+                    model_outputs[output_name] = model_outputs[output_name].to(self.device)
 
         return model_outputs
 
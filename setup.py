@@ -14,7 +14,6 @@ except Exception as error:
 
 REQUIRED_PKGS = [
     "coloredlogs",
-    "sympy",
     "transformers>=4.29",
     "torch>=1.11",
     "packaging",
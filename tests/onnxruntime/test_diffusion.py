@@ -13,7 +13,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import numpy as np
+import onnxruntime
 import pytest
 import torch
 from diffusers import (
@@ -21,6 +27,7 @@ from diffusers import (
     AutoPipelineForInpainting,
     AutoPipelineForText2Image,
     DiffusionPipeline,
+    PNDMScheduler,
 )
 from diffusers.pipelines.stable_diffusion import StableDiffusionSafetyChecker
 from diffusers.utils import load_image
@@ -111,6 +118,96 @@ class ORTPipelineForText2ImageTest(ORTModelTestMixin):
 
         self.assertEqual(ort_pipeline.auto_model_class, auto_pipeline.__class__)
 
+    @parameterized.expand(SUPPORTED_ARCHITECTURES)
+    @require_diffusers
+    def test_cuda_graph_requirements(self, model_arch: str):
+        model_args = {"test_name": model_arch, "model_arch": model_arch}
+        self._setup(model_args)
+
+        with self.assertRaises(ValueError) as context:
+            self.ORTMODEL_CLASS.from_pretrained(self.onnx_model_dirs[model_arch], enable_cuda_graph=True)
+        self.assertIn("CUDAExecutionProvider", str(context.exception))
+
+        with self.assertRaises(ValueError) as context:
+            self.ORTMODEL_CLASS.from_pretrained(
+                self.onnx_model_dirs[model_arch],
+                provider="CUDAExecutionProvider",
+                use_io_binding=False,
+                enable_cuda_graph=True,
+            )
+        self.assertIn("IO binding", str(context.exception))
+
+    @parameterized.expand(SUPPORTED_ARCHITECTURES)
+    @require_diffusers
+    def test_shared_cpu_allocator(self, model_arch: str):
+        model_args = {"test_name": model_arch, "model_arch": model_arch}
+        self._setup(model_args)
+
+        height, width, batch_size = 64, 64, 1
+        inputs = self.generate_inputs(height=height, width=width, batch_size=batch_size)
+
+        # the allocator is registered once, even when the pipelines are loaded concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            pipeline_futures = [
+                executor.submit(
+                    self.ORTMODEL_CLASS.from_pretrained,
+                    self.onnx_model_dirs[model_arch],
+                    use_shared_cpu_allocator=True,
+                )
+                for _ in range(2)
+            ]
+            pipelines = [pipeline_future.result() for pipeline_future in pipeline_futures]
+
+        outputs = pipelines[0](**inputs, generator=get_generator("pt", SEED)).images
+        shared_outputs = pipelines[1](**inputs, generator=get_generator("pt", SEED)).images
+
+        np.testing.assert_allclose(outputs, shared_outputs, atol=1e-4, rtol=1e-2)
+
+    @parameterized.expand(SUPPORTED_ARCHITECTURES)
+    @require_diffusers
+    def test_save_pretrained_does_not_alias_source(self, model_arch: str):
+        model_args = {"test_name": model_arch, "model_arch": model_arch}
+        self._setup(model_args)
+
+        ort_pipeline = self.ORTMODEL_CLASS.from_pretrained(self.onnx_model_dirs[model_arch])
+        source_path = Path(ort_pipeline.unet.session._model_path)
+        source_content = source_path.read_bytes()
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            ort_pipeline.save_pretrained(tmpdirname)
+            saved_path = Path(tmpdirname) / "unet" / "model.onnx"
+            self.assertEqual(saved_path.read_bytes(), source_content)
+
+            # overwrites the saved model in place, as onnx.save does
+            with open(saved_path, "r+b") as saved_file:
+                saved_file.write(b"\x00" * 16)
+
+        self.assertEqual(source_path.read_bytes(), source_content)
+
+    @parameterized.expand(SUPPORTED_ARCHITECTURES)
+    @require_diffusers
+    def test_save_pretrained_exported_does_not_alias_given_session(self, model_arch: str):
+        model_args = {"test_name": model_arch, "model_arch": model_arch}
+        self._setup(model_args)
+
+        # the exported models are owned by the pipeline, unlike the UNet session given along with the export
+        unet_path = Path(self.onnx_model_dirs[model_arch]) / "unet" / "model.onnx"
+        unet_session = onnxruntime.InferenceSession(str(unet_path), providers=["CPUExecutionProvider"])
+        ort_pipeline = self.ORTMODEL_CLASS.from_pretrained(MODEL_NAMES[model_arch], export=True, unet=unet_session)
+        source_content = unet_path.read_bytes()
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            ort_pipeline.save_pretrained(tmpdirname)
+            saved_path = Path(tmpdirname) / "unet" / "model.onnx"
+            self.assertEqual(saved_path.read_bytes(), source_content)
+            self.assertFalse(os.path.samefile(saved_path, unet_path))
+
+            # overwrites the saved model in place, as onnx.save does
+            with open(saved_path, "r+b") as saved_file:
+                saved_file.write(b"\x00" * 16)
+
+        self.assertEqual(unet_path.read_bytes(), source_content)
+
     @parameterized.expand(SUPPORTED_ARCHITECTURES)
     @require_diffusers
     def test_num_images_per_prompt(self, model_arch: str):
@@ -205,6 +302,124 @@ class ORTPipelineForText2ImageTest(ORTModelTestMixin):
                     (batch_size, 4, height // pipeline.vae_scale_factor, width // pipeline.vae_scale_factor),
                 )
 
+    @parameterized.expand(SUPPORTED_ARCHITECTURES)
+    @require_diffusers
+    def test_vae_tiling(self, model_arch: str):
+        model_args = {"test_name": model_arch, "model_arch": model_arch}
+        self._setup(model_args)
+
+        height, width, batch_size = 128, 64, 1
+        inputs = self.generate_inputs(height=height, width=width, batch_size=batch_size)
+
+        pipeline = self.ORTMODEL_CLASS.from_pretrained(self.onnx_model_dirs[model_arch])
+        outputs = pipeline(**inputs, generator=get_generator("pt", SEED)).images
+
+        # tiles smaller than the generated image, so that the latents are decoded in several overlapping tiles
+        pipeline.enable_vae_tiling()
+        pipeline.vae.tile_sample_min_size = 32
+        pipeline.vae.tile_latent_min_size = 32 // pipeline.vae_scale_factor
+        tiled_outputs = pipeline(**inputs, generator=get_generator("pt", SEED)).images
+
+        self.assertEqual(tiled_outputs.shape, outputs.shape)
+        self.assertTrue(np.isfinite(tiled_outputs).all())
+
+        # latents fitting in a single tile are decoded at once
+        latents = torch.randn((1, pipeline.vae.config.latent_channels, 4, 4), generator=get_generator("pt", SEED))
+        pipeline.vae.tile_latent_min_size = 4
+        np.testing.assert_array_equal(
+            pipeline.vae.tiled_decode(latents)[0].numpy(), pipeline.vae.decoder(latents)[0].numpy()
+        )
+
+        # with a decoder only upsampling the latents, the overlapping tiles are identical where they are blended, so
+        # the stitched tiles reproduce the untiled decoding if they are cropped and ordered correctly
+        scale_factor = pipeline.vae_scale_factor
+
+        def upsampling_decoder(latent_sample, generator=None, return_dict=False):
+            sample = latent_sample.repeat_interleave(scale_factor, dim=2).repeat_interleave(scale_factor, dim=3)
+            return {"sample": sample}
+
+        latents = torch.randn((1, pipeline.vae.config.latent_channels, 16, 8), generator=get_generator("pt", SEED))
+        pipeline.vae.decoder = upsampling_decoder
+        pipeline.vae.tile_latent_min_size = 4
+        pipeline.vae.tile_sample_min_size = 4 * scale_factor
+        tiled_sample = pipeline.vae.tiled_decode(latents, return_dict=True)["sample"]
+
+        np.testing.assert_allclose(tiled_sample.numpy(), upsampling_decoder(latents)["sample"].numpy(), atol=1e-5)
+
+    @parameterized.expand(SUPPORTED_ARCHITECTURES)
+    @require_diffusers
+    def test_io_binding_converts_modified_inputs(self, model_arch: str):
+        model_args = {"test_name": model_arch, "model_arch": model_arch}
+        self._setup(model_args)
+
+        pipeline = self.ORTMODEL_CLASS.from_pretrained(self.onnx_model_dirs[model_arch])
+        text_encoder = pipeline.text_encoder
+
+        # int32 input ids are converted to the int64 expected by the session
+        input_ids = torch.ones((1, pipeline.tokenizer.model_max_length), dtype=torch.int32)
+        text_encoder.run_with_io_binding({"input_ids": input_ids}, output_names=["last_hidden_state"])
+
+        # the input is modified in place, the converted copy of the previous call can not be reused
+        input_ids[:, 1:] = 2
+        io_outputs = text_encoder.run_with_io_binding({"input_ids": input_ids}, output_names=["last_hidden_state"])
+        outputs = text_encoder(input_ids.long(), return_dict=True)
+
+        np.testing.assert_allclose(
+            io_outputs["last_hidden_state"].numpy(), outputs["last_hidden_state"].numpy(), atol=1e-4, rtol=1e-2
+        )
+
+    @parameterized.expand(SUPPORTED_ARCHITECTURES)
+    @require_diffusers
+    def test_io_binding_converts_inference_mode_inputs(self, model_arch: str):
+        model_args = {"test_name": model_arch, "model_arch": model_arch}
+        self._setup(model_args)
+
+        pipeline = self.ORTMODEL_CLASS.from_pretrained(self.onnx_model_dirs[model_arch])
+        text_encoder = pipeline.text_encoder
+
+        # the tensors created in inference mode have no version counter
+        with torch.inference_mode():
+            input_ids = torch.ones((1, pipeline.tokenizer.model_max_length), dtype=torch.int32)
+            text_encoder.run_with_io_binding({"input_ids": input_ids}, output_names=["last_hidden_state"])
+
+            input_ids[:, 1:] = 2
+            io_outputs = text_encoder.run_with_io_binding({"input_ids": input_ids}, output_names=["last_hidden_state"])
+            outputs = text_encoder(input_ids.long(), return_dict=True)
+
+        np.testing.assert_allclose(
+            io_outputs["last_hidden_state"].numpy(), outputs["last_hidden_state"].numpy(), atol=1e-4, rtol=1e-2
+        )
+
+    @parameterized.expand(SUPPORTED_ARCHITECTURES)
+    @require_diffusers
+    def test_unet_forward_async(self, model_arch: str):
+        model_args = {"test_name": model_arch, "model_arch": model_arch}
+        self._setup(model_args)
+
+        height, width, batch_size = 64, 64, 1
+        inputs = self.generate_inputs(height=height, width=width, batch_size=batch_size)
+        inputs["num_inference_steps"] = 1
+
+        pipeline = self.ORTMODEL_CLASS.from_pretrained(self.onnx_model_dirs[model_arch])
+
+        # records the inputs the pipeline gives to the UNet
+        unet_calls = []
+        unet_forward = pipeline.unet.forward
+
+        def recording_forward(*args, **kwargs):
+            unet_calls.append((args, kwargs))
+            return unet_forward(*args, **kwargs)
+
+        pipeline.unet.forward = recording_forward
+        pipeline(**inputs)
+        del pipeline.unet.forward
+
+        args, kwargs = unet_calls[0]
+        outputs = pipeline.unet.forward(*args, **kwargs)[0]
+        async_outputs = pipeline.unet.forward_async(*args, **kwargs).result()[0]
+
+        np.testing.assert_allclose(async_outputs.numpy(), outputs.numpy())
+
     @parameterized.expand(SUPPORTED_ARCHITECTURES)
     @require_diffusers
     def test_image_reproducibility(self, model_arch: str):
@@ -291,6 +506,98 @@ class ORTPipelineForText2ImageTest(ORTModelTestMixin):
         self.assertIsInstance(outputs, np.ndarray)
         self.assertEqual(outputs.shape, (batch_size, height, width, 3))
 
+    @parameterized.expand(SUPPORTED_ARCHITECTURES)
+    @pytest.mark.cuda_ep_test
+    @require_torch_gpu
+    @require_diffusers
+    def test_compare_generation_to_io_binding(self, model_arch: str):
+        model_args = {"test_name": model_arch, "model_arch": model_arch}
+        self._setup(model_args)
+
+        height, width, batch_size = 64, 64, 1
+        inputs = self.generate_inputs(height=height, width=width, batch_size=batch_size)
+        inputs["output_type"] = "pt"
+
+        pipeline = self.ORTMODEL_CLASS.from_pretrained(
+            self.onnx_model_dirs[model_arch], provider="CUDAExecutionProvider", use_io_binding=False
+        )
+        io_pipeline = self.ORTMODEL_CLASS.from_pretrained(
+            self.onnx_model_dirs[model_arch], provider="CUDAExecutionProvider", use_io_binding=True
+        )
+
+        outputs = pipeline(**inputs, generator=get_generator("pt", SEED)).images
+        io_outputs = io_pipeline(**inputs, generator=get_generator("pt", SEED)).images
+
+        self.assertEqual(io_outputs.device.type, "cuda")
+        torch.testing.assert_close(outputs, io_outputs, atol=1e-4, rtol=1e-2)
+
+    @parameterized.expand(["stable-diffusion"])
+    @pytest.mark.cuda_ep_test
+    @require_torch_gpu
+    @require_diffusers
+    def test_compare_generation_to_cuda_graph(self, model_arch: str):
+        model_args = {"test_name": model_arch, "model_arch": model_arch}
+        self._setup(model_args)
+
+        height, width, batch_size = 64, 64, 1
+        inputs = self.generate_inputs(height=height, width=width, batch_size=batch_size)
+        inputs["output_type"] = "pt"
+        inputs["num_inference_steps"] = 4
+
+        io_pipeline = self.ORTMODEL_CLASS.from_pretrained(
+            self.onnx_model_dirs[model_arch], provider="CUDAExecutionProvider", use_io_binding=True
+        )
+        graph_pipeline = self.ORTMODEL_CLASS.from_pretrained(
+            self.onnx_model_dirs[model_arch],
+            provider="CUDAExecutionProvider",
+            use_io_binding=True,
+            enable_cuda_graph=True,
+        )
+        # the PNDM scheduler keeps the UNet outputs of the previous steps, which the graph replays must not overwrite
+        io_pipeline.scheduler = PNDMScheduler.from_config(io_pipeline.scheduler.config)
+        graph_pipeline.scheduler = PNDMScheduler.from_config(graph_pipeline.scheduler.config)
+
+        # the first call captures the graph, the following ones replay it
+        for seed in [SEED, SEED + 1]:
+            outputs = io_pipeline(**inputs, generator=get_generator("pt", seed)).images
+            graph_outputs = graph_pipeline(**inputs, generator=get_generator("pt", seed)).images
+            torch.testing.assert_close(outputs, graph_outputs, atol=1e-4, rtol=1e-2)
+
+        inputs = self.generate_inputs(height=height // 2, width=width, batch_size=batch_size)
+        with self.assertRaises(ValueError) as context:
+            graph_pipeline(**inputs)
+        self.assertIn("CUDA graph", str(context.exception))
+
+    @parameterized.expand(["stable-diffusion-xl"])
+    @pytest.mark.cuda_ep_test
+    @require_torch_gpu
+    @require_diffusers
+    def test_compare_text_encoder_to_io_binding(self, model_arch: str):
+        model_args = {"test_name": model_arch, "model_arch": model_arch}
+        self._setup(model_args)
+
+        pipeline = self.ORTMODEL_CLASS.from_pretrained(
+            self.onnx_model_dirs[model_arch], provider="CUDAExecutionProvider", use_io_binding=False
+        )
+        io_pipeline = self.ORTMODEL_CLASS.from_pretrained(
+            self.onnx_model_dirs[model_arch], provider="CUDAExecutionProvider", use_io_binding=True
+        )
+
+        # the second text encoder of SDXL also outputs the projected text embeddings
+        input_ids = io_pipeline.tokenizer_2(
+            ["sailing ship in storm by Leonardo da Vinci"] * 2,
+            padding="max_length",
+            max_length=io_pipeline.tokenizer_2.model_max_length,
+            return_tensors="pt",
+        ).input_ids.to("cuda")
+
+        outputs = pipeline.text_encoder_2(input_ids, return_dict=True)
+        io_outputs = io_pipeline.text_encoder_2(input_ids, return_dict=True)
+
+        for output_name in ["text_embeds", "last_hidden_state"]:
+            self.assertEqual(io_outputs[output_name].device.type, "cuda")
+            torch.testing.assert_close(outputs[output_name].cpu(), io_outputs[output_name].cpu(), atol=1e-4, rtol=1e-2)
+
     @parameterized.expand(["stable-diffusion", "latent-consistency"])
     @require_diffusers
     def test_safety_checker(self, model_arch: str):
@@ -505,6 +812,31 @@ class ORTPipelineForImage2ImageTest(ORTModelTestMixin):
         self.assertIsInstance(outputs, np.ndarray)
         self.assertEqual(outputs.shape, (batch_size, height, width, 3))
 
+    @parameterized.expand(SUPPORTED_ARCHITECTURES)
+    @pytest.mark.cuda_ep_test
+    @require_torch_gpu
+    @require_diffusers
+    def test_compare_generation_to_io_binding(self, model_arch: str):
+        model_args = {"test_name": model_arch, "model_arch": model_arch}
+        self._setup(model_args)
+
+        height, width, batch_size = 64, 64, 1
+        inputs = self.generate_inputs(height=height, width=width, batch_size=batch_size)
+        inputs["output_type"] = "pt"
+
+        pipeline = self.ORTMODEL_CLASS.from_pretrained(
+            self.onnx_model_dirs[model_arch], provider="CUDAExecutionProvider", use_io_binding=False
+        )
+        io_pipeline = self.ORTMODEL_CLASS.from_pretrained(
+            self.onnx_model_dirs[model_arch], provider="CUDAExecutionProvider", use_io_binding=True
+        )
+
+        outputs = pipeline(**inputs, generator=get_generator("pt", SEED)).images
+        io_outputs = io_pipeline(**inputs, generator=get_generator("pt", SEED)).images
+
+        self.assertEqual(io_outputs.device.type, "cuda")
+        torch.testing.assert_close(outputs, io_outputs, atol=1e-4, rtol=1e-2)
+
     @parameterized.expand(["stable-diffusion", "latent-consistency"])
     @require_diffusers
     def test_safety_checker(self, model_arch: str):
@@ -725,6 +1057,31 @@ class ORTPipelineForInpaintingTest(ORTModelTestMixin):
         self.assertIsInstance(outputs, np.ndarray)
         self.assertEqual(outputs.shape, (batch_size, height, width, 3))
 
+    @parameterized.expand(SUPPORTED_ARCHITECTURES)
+    @pytest.mark.cuda_ep_test
+    @require_torch_gpu
+    @require_diffusers
+    def test_compare_generation_to_io_binding(self, model_arch: str):
+        model_args = {"test_name": model_arch, "model_arch": model_arch}
+        self._setup(model_args)
+
+        height, width, batch_size = 64, 64, 1
+        inputs = self.generate_inputs(height=height, width=width, batch_size=batch_size)
+        inputs["output_type"] = "pt"
+
+        pipeline = self.ORTMODEL_CLASS.from_pretrained(
+            self.onnx_model_dirs[model_arch], provider="CUDAExecutionProvider", use_io_binding=False
+        )
+        io_pipeline = self.ORTMODEL_CLASS.from_pretrained(
+            self.onnx_model_dirs[model_arch], provider="CUDAExecutionProvider", use_io_binding=True
+        )
+
+        outputs = pipeline(**inputs, generator=get_generator("pt", SEED)).images
+        io_outputs = io_pipeline(**inputs, generator=get_generator("pt", SEED)).images
+
+        self.assertEqual(io_outputs.device.type, "cuda")
+        torch.testing.assert_close(outputs, io_outputs, atol=1e-4, rtol=1e-2)
+
     @parameterized.expand(["stable-diffusion"])
     @require_diffusers
     def test_safety_checker(self, model_arch: str):
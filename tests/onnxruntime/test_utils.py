@@ -5,6 +5,7 @@ import onnxruntime as ort
 import torch
 
 from optimum.onnxruntime.configuration import AutoQuantizationConfig, OptimizationConfig, ORTConfig
+from optimum.onnxruntime.modeling_ort import _parse_axis_expression
 from optimum.onnxruntime.utils import get_device_for_provider, get_provider_for_device
 
 
@@ -33,3 +34,17 @@ class ORTConfigTest(unittest.TestCase):
             ort_config.save_pretrained(tmp_dir)
             loaded_ort_config = ORTConfig.from_pretrained(tmp_dir)
             self.assertEqual(ort_config.to_dict(), loaded_ort_config.to_dict())
+
+
+class AxisExpressionParserTest(unittest.TestCase):
+    def test_parse_axis_expression(self):
+        values = {"batch_size": 2, "sequence_length": 3, "past_sequence_length": 7, "height": 64}
+
+        self.assertEqual(_parse_axis_expression(["past_sequence_length", "+", "sequence_length"])(values), 10)
+        self.assertEqual(_parse_axis_expression(["2", "*", "(", "batch_size", "-", "1", ")"])(values), 2)
+        self.assertEqual(_parse_axis_expression(["height", "/", "/", "8"])(values), 8)
+        self.assertEqual(_parse_axis_expression(["-", "batch_size", "+", "sequence_length"])(values), 1)
+
+        for tokens in (["(", "height"], ["height", ")"], ["height", "."], ["+"]):
+            with self.assertRaises(ValueError):
+                _parse_axis_expression(tokens)